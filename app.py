@@ -1,12 +1,24 @@
 from shiny import App, ui, render, reactive
+from shiny.types import SilentException
 import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 import os
+import sys
 from pathlib import Path
-import json
+import orjson
 import re
 import logging
+import logging.handlers
+import queue
+import threading
+import atexit
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from datetime import datetime
 from dotenv import load_dotenv
 from src.structured_trts.extract import MODEL_CONFIGS
@@ -14,15 +26,20 @@ from src.structured_trts.extract import MODEL_CONFIGS
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging: records are queued on the calling thread and written by a
+# background listener, so file/console I/O stays off the reactive loop
+_log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_log_handlers = [logging.FileHandler('app.log'), logging.StreamHandler()]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+_log_queue = queue.Queue(-1)
+_queue_handler = logging.handlers.QueueHandler(_log_queue)
+# Only merge the message args here; the listener's handlers apply the full format
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler])
+_log_listener = logging.handlers.QueueListener(_log_queue, *_log_handlers)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
 
 # Global variables
@@ -30,24 +47,71 @@ DATA_DIR = Path("data")
 EXTRACTED_DIR = DATA_DIR / "extracted"
 NEON_DB_URL = os.getenv("NEON_DB")
 TEXTOS_FILE = DATA_DIR / "textos_completo.parquet"
+_SCHEMA_SENTINEL = DATA_DIR / ".schema_v2"
+# Worker threads for parquet/DB loads; pyarrow releases the GIL while decoding
+_IO_POOL = ThreadPoolExecutor(max_workers=2)
+# Model key -> display name, interned so equality checks on names are pointer compares
+_MODEL_KEY_TO_NAME = {key: sys.intern(config.name) for key, config in MODEL_CONFIGS.items()}
+EXTRACTED_COLUMNS = ('processo', 'model_name', 'success', 'error_message', 'extracted_data')
+
+# Placeholder texts shown in the text pane instead of a real input text
+TEXT_ALREADY_VALIDATED = "Caso já anotado para este modelo"
+TEXT_NOT_FOUND = "Texto não encontrado para este processo"
+TEXT_UNAVAILABLE = "Dados de texto não disponíveis"
+TEXT_NO_DATA = "Nenhum dado disponível"
+_PLACEHOLDER_TEXTS = frozenset({TEXT_ALREADY_VALIDATED, TEXT_NOT_FOUND, TEXT_UNAVAILABLE, TEXT_NO_DATA})
+
+# Regex patterns used by parse_input_text, compiled once per process
+_META_RE = re.compile(r'<metadados>(.*?)</metadados>', re.DOTALL)
+_TEXTOS_RE = re.compile(r'<textos>(.*?)</textos>', re.DOTALL)
+_FILE_SPLIT_RE = re.compile(r'# Arquivo ([^\n]+\.txt) --+')
+_POTENTIAL_FILE_RE = re.compile(r'\n(?=\w+\.txt|\d+\.txt|arquivo)', re.IGNORECASE)
+
+# Connection pool shared by all sessions, so each query skips the TCP/TLS/auth handshake.
+# Created on first use, so startup makes no database round-trip; psycopg2 only keeps
+# `minconn` idle connections, sized to the I/O workers plus the reactive thread
+_PG_POOL_MINCONN = 3
+_PG_POOL = None
+_PG_POOL_LOCK = threading.Lock()
+
+def _get_pg_pool():
+    global _PG_POOL
+    if _PG_POOL is None:
+        with _PG_POOL_LOCK:
+            if _PG_POOL is None:
+                _PG_POOL = psycopg2.pool.ThreadedConnectionPool(_PG_POOL_MINCONN, 8, NEON_DB_URL)
+    return _PG_POOL
 
 def get_db_connection():
-    """Get a connection to the NeonDB PostgreSQL database."""
+    """Get a pooled connection to the NeonDB PostgreSQL database."""
     if not NEON_DB_URL:
         raise ValueError("NEON_DB environment variable not set")
-    return psycopg2.connect(NEON_DB_URL)
+    return _get_pg_pool().getconn()
+
+def release_db_connection(conn):
+    """Return a connection to the pool, discarding it if the server already closed it."""
+    _get_pg_pool().putconn(conn, close=bool(conn.closed))
 
 # Initialize validation database
 def parse_input_text(text):
     """Parse the input text to extract metadata and separate files."""
-    logger.info("Starting text parsing")
     if not text:
         logger.warning("No text provided for parsing")
         return None, []
+    if text in _PLACEHOLDER_TEXTS:
+        # Status messages have no metadata or files, skip the regex passes
+        return None, []
+    # Cached by text; the returned list is shared, so callers must not mutate it
+    return _parse_input_text_cached(text)
+
+@lru_cache(maxsize=64)
+def _parse_input_text_cached(text):
+    """Parse a non-empty input text; results are memoized per process."""
+    logger.info("Starting text parsing")
     
     # Extract metadata section
-    metadata_match = re.search(r'<metadados>(.*?)</metadados>', text, re.DOTALL)
-    textos_match = re.search(r'<textos>(.*?)</textos>', text, re.DOTALL)
+    metadata_match = _META_RE.search(text)
+    textos_match = _TEXTOS_RE.search(text)
     
     metadata_content = None
     files_list = []
@@ -57,10 +121,10 @@ def parse_input_text(text):
         logger.info(f"Found metadata section with {len(metadata_raw)} characters")
         try:
             # Try to parse and format JSON
-            metadata_json = json.loads(metadata_raw)
-            metadata_content = json.dumps(metadata_json, indent=2, ensure_ascii=False)
+            metadata_json = orjson.loads(metadata_raw)
+            metadata_content = orjson.dumps(metadata_json, option=orjson.OPT_INDENT_2).decode()
             logger.info("Successfully parsed metadata JSON")
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.warning(f"Failed to parse metadata as JSON: {e}")
             metadata_content = metadata_raw
     else:
@@ -68,21 +132,21 @@ def parse_input_text(text):
     
     if textos_match:
         textos_content = textos_match.group(1).strip()
-        # Split by file separators
-        files = re.split(r'# Arquivo ([^\n]+\.txt) --+', textos_content)
-        
-        if len(files) > 1:
-            logger.info(f"Found {(len(files)-1)//2} files using standard pattern")
-            for i in range(1, len(files), 2):
-                if i + 1 < len(files):
-                    filename = files[i]
-                    content = files[i + 1].strip()
-                    logger.info(f"Extracted file: {filename} ({len(content)} chars)")
-                    files_list.append({"filename": filename, "content": content})
+        # Walk file separators, slicing each file's content up to the next separator
+        separators = list(_FILE_SPLIT_RE.finditer(textos_content))
+        
+        if separators:
+            logger.info(f"Found {len(separators)} files using standard pattern")
+            ends = [m.start() for m in separators[1:]] + [len(textos_content)]
+            for match, end in zip(separators, ends):
+                filename = match.group(1)
+                content = textos_content[match.end():end].strip()
+                logger.info(f"Extracted file: {filename} ({len(content)} chars)")
+                files_list.append({"filename": filename, "content": content})
         else:
             # If no file separators found, try to split by common patterns or treat as single file
             # Look for potential file patterns in the content
-            potential_files = re.split(r'\n(?=\w+\.txt|\d+\.txt|arquivo)', textos_content, flags=re.IGNORECASE)
+            potential_files = _POTENTIAL_FILE_RE.split(textos_content)
             if len(potential_files) > 1:
                 for i, file_content in enumerate(potential_files):
                     if file_content.strip():
@@ -104,6 +168,36 @@ def parse_input_text(text):
     logger.info(f"Parsing completed: {len(files_list)} files extracted")
     return metadata_content, files_list
 
+@lru_cache(maxsize=32)
+def build_input_accordion(raw_text):
+    """Build the input text accordion; memoized per text so unrelated re-renders reuse the tag tree."""
+    metadata_content, files_list = parse_input_text(raw_text)
+    
+    accordion_items = []
+    
+    # Add metadata accordion item
+    if metadata_content:
+        accordion_items.append(
+            ui.accordion_panel(
+                "📋 Metadados",
+                ui.pre(metadata_content, style="font-size: 11px; line-height: 1.3; margin: 0; white-space: pre-wrap;")
+            )
+        )
+    
+    # Add file accordion items
+    for file_info in files_list:
+        accordion_items.append(
+            ui.accordion_panel(
+                f"📄 {file_info['filename']}",
+                ui.pre(file_info['content'], style="font-size: 11px; line-height: 1.3; margin: 0; white-space: pre-wrap;")
+            )
+        )
+    
+    if not accordion_items:
+        return ui.p("Nenhum conteúdo disponível")
+    
+    return ui.accordion(*accordion_items, id="input_accordion", open=False)
+
 def init_validation_db():
     """Initialize the validation database if it doesn't exist."""
     logger.info("Initializing validation database on NeonDB")
@@ -128,6 +222,11 @@ def init_validation_db():
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        # Serves both the per-case lookup and the per-model validated set
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_validations_model_proc
+            ON validations (model_name, processo)
+        """)
         
         conn.commit()
         logger.info("Validation database schema created successfully")
@@ -138,7 +237,7 @@ def init_validation_db():
         raise
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
 def get_extracted_files():
     """Get list of extracted parquet files."""
@@ -150,6 +249,26 @@ def get_extracted_files():
     logger.info(f"Found {len(files)} extracted files")
     return files
 
+@lru_cache(maxsize=16)
+def _read_parquet_cached(path_str, mtime_ns, columns=None, filters=None, categories=None):
+    """Read a parquet file into a DataFrame, memoized per (path, mtime, columns, filters).
+
+    The mtime is part of the key so entries are invalidated when the file is rewritten.
+    Columns listed in `categories` are decoded as pandas categoricals.
+    Cached frames are shared between callers and must not be mutated in place.
+    """
+    table = pq.read_table(
+        path_str,
+        columns=list(columns) if columns else None,
+        filters=list(filters) if filters else None,
+        read_dictionary=list(categories) if categories else None
+    )
+    return table.to_pandas()
+
+def _read_parquet(path, columns=None, filters=None, categories=None):
+    """Read a parquet file through the mtime-keyed cache."""
+    return _read_parquet_cached(str(path), os.stat(path).st_mtime_ns, columns, filters, categories)
+
 def load_extracted_data(filename, model_name=None):
     """Load extracted data from parquet file."""
     file_path = EXTRACTED_DIR / f"{filename}.parquet"
@@ -159,34 +278,80 @@ def load_extracted_data(filename, model_name=None):
         return pd.DataFrame()
     
     try:
-        df = pd.read_parquet(file_path)
-        logger.info(f"Loaded {len(df)} rows from {filename}")
-        if model_name:
-            df_filtered = df[df['model_name'] == model_name]
-            logger.info(f"Filtered to {len(df_filtered)} rows for model {model_name}")
-            return df_filtered
+        # Push the model filter into the parquet reader and read only the columns the app uses
+        df = _read_parquet(
+            file_path,
+            columns=EXTRACTED_COLUMNS,
+            filters=(('model_name', '==', model_name),) if model_name else None,
+            categories=('processo', 'model_name')
+        )
+        logger.info(f"Loaded {len(df)} rows from {filename} for model {model_name}")
         return df
     except Exception as e:
         logger.error(f"Error loading parquet file {file_path}: {e}")
         return pd.DataFrame()
 
-def load_textos_data():
-    """Load the complete texts data."""
-    logger.info(f"Loading textos data from {TEXTOS_FILE}")
+def load_extracted_processos(filename, model_name):
+    """Load only the processo numbers of an extracted file for a given model."""
+    file_path = EXTRACTED_DIR / f"{filename}.parquet"
+    logger.info(f"Loading extracted processos from {file_path} for model {model_name}")
+    if not file_path.exists():
+        logger.error(f"File {file_path} doesn't exist")
+        return []
+    
+    try:
+        dataset = ds.dataset(file_path, format='parquet')
+        table = dataset.to_table(columns=['processo'], filter=ds.field('model_name') == model_name)
+        return table.column('processo').to_pylist()
+    except Exception as e:
+        logger.error(f"Error loading parquet file {file_path}: {e}")
+        return []
+
+@lru_cache(maxsize=4)
+def _textos_index(path_str, mtime_ns):
+    """Map each processo to its (row group, row offset) in the textos parquet file.
+
+    Built once per file version from the processo column only.
+    """
+    parquet_file = pq.ParquetFile(path_str)
+    index = {}
+    for row_group in range(parquet_file.num_row_groups):
+        processos = parquet_file.read_row_group(row_group, columns=['processo']).column('processo')
+        for offset, processo in enumerate(processos.to_pylist()):
+            index.setdefault(processo, (row_group, offset))
+    return index
+
+@lru_cache(maxsize=16)
+def _read_textos_row_cached(path_str, mtime_ns, processo_num):
+    """Read the text row for one processo through the prebuilt index; empty if not found."""
+    location = _textos_index(path_str, mtime_ns).get(processo_num)
+    if location is None:
+        return pd.DataFrame(columns=['processo', 'txt_sentencas'])
+    row_group, offset = location
+    parquet_file = pq.ParquetFile(path_str, read_dictionary=['processo'])
+    table = parquet_file.read_row_group(row_group, columns=['processo', 'txt_sentencas'])
+    return table.take([offset]).to_pandas()
+
+def load_text_for_processo(processo_num):
+    """Load the text row for a single processo, reading only the needed columns and row group."""
+    logger.info(f"Loading text for processo {processo_num} from {TEXTOS_FILE}")
     if not TEXTOS_FILE.exists():
         logger.error(f"Textos file {TEXTOS_FILE} doesn't exist")
         return pd.DataFrame()
     try:
-        df = pd.read_parquet(TEXTOS_FILE)
-        logger.info(f"Loaded {len(df)} text records")
+        df = _read_textos_row_cached(str(TEXTOS_FILE), os.stat(TEXTOS_FILE).st_mtime_ns, processo_num)
+        logger.info(f"Loaded {len(df)} text records for processo {processo_num}")
         return df
     except Exception as e:
         logger.error(f"Error loading textos file: {e}")
         return pd.DataFrame()
 
-def get_validated_cases(model_name):
-    """Get set of processo numbers that have been validated for a given model."""
-    logger.info(f"Getting validated cases for model: {model_name}")
+# In-process cache of validated (processo, model_name) pairs, seeded per model on first use
+_VALIDATED = set()
+_VALIDATED_MODELS = set()
+
+def _fetch_validated_cases(model_name):
+    """Query the set of validated processo numbers for a model, raising on database errors."""
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -198,69 +363,97 @@ def get_validated_cases(model_name):
         """, (model_name,))
         
         result = cursor.fetchall()
-        validated_set = {row[0] for row in result}
+        return {row[0] for row in result}
+    finally:
+        cursor.close()
+        release_db_connection(conn)
+
+def get_validated_cases(model_name):
+    """Get set of processo numbers that have been validated for a given model."""
+    logger.info(f"Getting validated cases for model: {model_name}")
+    try:
+        validated_set = _fetch_validated_cases(model_name)
         logger.info(f"Found {len(validated_set)} validated cases for model {model_name}")
         return validated_set
     except Exception as e:
         logger.error(f"Error querying validated cases: {e}")
         return set()
-    finally:
-        cursor.close()
-        conn.close()
 
-def is_case_validated(processo, model_name):
-    """Check if a specific processo-model combination has been validated."""
+def _load_validated(model_name):
+    """Seed the validated-cases cache for a model. Returns False if it could not be loaded."""
+    if model_name in _VALIDATED_MODELS:
+        return True
+    logger.info(f"Loading validated cases cache for model: {model_name}")
+    try:
+        validated_set = _fetch_validated_cases(model_name)
+    except Exception as e:
+        logger.error(f"Error querying validated cases: {e}")
+        return False
+    _VALIDATED.update((processo, model_name) for processo in validated_set)
+    _VALIDATED_MODELS.add(model_name)
+    logger.info(f"Cached {len(validated_set)} validated cases for model {model_name}")
+    return True
+
+def _db_is_case_validated(processo, model_name):
+    """Check in the database if a specific processo-model combination has been validated."""
     conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
         cursor.execute("""
-            SELECT COUNT(*) 
+            SELECT 1 
             FROM validations 
             WHERE processo = %s AND model_name = %s
+            LIMIT 1
         """, (processo, model_name))
         
-        result = cursor.fetchone()
-        return result[0] > 0
+        return cursor.fetchone() is not None
     except Exception as e:
         logger.error(f"Error checking if case is validated: {e}")
         return False
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
-def save_validation(validation_data):
-    """Save validation data to database."""
-    logger.info(f"Saving validation for processo {validation_data.get('processo')} and model {validation_data.get('model_name')}")
+def is_case_validated(processo, model_name):
+    """Check if a specific processo-model combination has been validated."""
+    if _load_validated(model_name):
+        return (processo, model_name) in _VALIDATED
+    # Cache could not be seeded, fall back to a direct query
+    return _db_is_case_validated(processo, model_name)
+
+def _validation_row(validation_data):
+    """Build the INSERT tuple for one validation, serializing claim validations to JSON."""
+    return (
+        validation_data['processo'],
+        validation_data['model_name'],
+        validation_data['gratuidade_correct'],
+        validation_data['decision_type_correct'],
+        validation_data['custas_correct'],
+        validation_data['claims_list_correct'],
+        orjson.dumps(validation_data.get('claim_outcomes', {}), option=orjson.OPT_NON_STR_KEYS).decode(),
+        orjson.dumps(validation_data.get('claim_values', {}), option=orjson.OPT_NON_STR_KEYS).decode(),
+        orjson.dumps(validation_data.get('claim_relevance', {}), option=orjson.OPT_NON_STR_KEYS).decode(),
+        validation_data['valor_total_decisao_correct']
+    )
+
+def save_validations(validations):
+    """Save a batch of validations to database in a single INSERT and COMMIT."""
+    logger.info(f"Saving {len(validations)} validations")
     conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
-        # Convert claim validations to JSON
-        claim_outcomes_json = json.dumps(validation_data.get('claim_outcomes', {}))
-        claim_values_json = json.dumps(validation_data.get('claim_values', {}))
-        claim_relevance_json = json.dumps(validation_data.get('claim_relevance', {}))
-        
-        cursor.execute("""
+        psycopg2.extras.execute_values(cursor, """
             INSERT INTO validations (
                 processo, model_name, gratuidade_correct, decision_type_correct,
                 custas_correct, claims_list_correct, claim_outcomes, claim_values, 
                 claim_relevance, valor_total_decisao_correct
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            validation_data['processo'],
-            validation_data['model_name'],
-            validation_data['gratuidade_correct'],
-            validation_data['decision_type_correct'],
-            validation_data['custas_correct'],
-            validation_data['claims_list_correct'],
-            claim_outcomes_json,
-            claim_values_json,
-            claim_relevance_json,
-            validation_data['valor_total_decisao_correct']
-        ))
+            ) VALUES %s
+        """, [_validation_row(v) for v in validations])
         
         conn.commit()
+        _VALIDATED.update((v['processo'], v['model_name']) for v in validations)
         logger.info("Validation data saved successfully")
         
     except Exception as e:
@@ -269,11 +462,83 @@ def save_validation(validation_data):
         raise
     finally:
         cursor.close()
-        conn.close()
+        release_db_connection(conn)
 
-# Initialize database
+def save_validation(validation_data):
+    """Save validation data to database."""
+    logger.info(f"Saving validation for processo {validation_data.get('processo')} and model {validation_data.get('model_name')}")
+    save_validations([validation_data])
+
+def load_case(filename, model_name, include_annotated):
+    """Load the case to validate for a process file and model.
+
+    Returns a (data, text, already_validated) tuple for the server's reactive values.
+    """
+    logger.info("Loading current data")
+    if not filename:
+        logger.info("No process selected, skipping data load")
+        return None, "", False
+        
+    logger.info(f"Loading data for process: {filename}, model: {model_name}")
+    # Only the processo column is needed to decide whether the case is already validated
+    processos = load_extracted_processos(filename, model_name)
+    
+    if processos:
+        # Get first case (could be validated or not)
+        processo_num = processos[0]
+        
+        # Check if this specific case is already validated
+        case_validated = is_case_validated(processo_num, model_name)
+        logger.info(f"Case {processo_num} validation status: {case_validated}")
+        
+        # If case is validated and user doesn't want to include annotated cases
+        if case_validated and not include_annotated:
+            logger.info(f"Case {processo_num} already validated and include_annotated is False")
+            # Still return data for processo info, without loading the full extraction
+            return {'processo': processo_num, 'model_name': model_name}, TEXT_ALREADY_VALIDATED, True
+        
+        df = load_extracted_data(filename, model_name)
+    else:
+        df = pd.DataFrame()
+    
+    if not df.empty:
+        logger.info(f"Loaded {len(df)} records from extracted data")
+        
+        selected_case = df.iloc[0].to_dict()
+        # Decode JSON-string extractions once here so renders read a plain dict
+        if isinstance(selected_case.get('extracted_data'), str):
+            selected_case['extracted_data'] = orjson.loads(selected_case['extracted_data'])
+        processo_num = selected_case['processo']
+        
+        # Normal case - either not validated or user wants to include annotated
+        logger.info(f"Selected case: processo {processo_num}")
+        
+        # Load corresponding text
+        if TEXTOS_FILE.exists():
+            logger.info(f"Looking for text for processo {processo_num}")
+            text_row = load_text_for_processo(processo_num)
+            if not text_row.empty:
+                logger.info(f"Found text with {len(text_row.iloc[0]['txt_sentencas'])} characters")
+                return selected_case, text_row.iloc[0]['txt_sentencas'], False
+            else:
+                logger.warning(f"No text found for processo {processo_num}")
+                return selected_case, TEXT_NOT_FOUND, False
+        else:
+            logger.warning("No textos data available")
+            return selected_case, TEXT_UNAVAILABLE, False
+    else:
+        logger.info("No data available for selected process/model")
+        return None, TEXT_NO_DATA, False
+
+# Initialize database, skipping the round-trip when the sentinel says the schema is current.
+# Bump the version suffix after schema changes to force re-initialization.
 logger.info("Starting Shiny app initialization")
-init_validation_db()
+if not _SCHEMA_SENTINEL.exists():
+    init_validation_db()
+    _SCHEMA_SENTINEL.parent.mkdir(parents=True, exist_ok=True)
+    _SCHEMA_SENTINEL.touch()
+else:
+    logger.info(f"Schema sentinel {_SCHEMA_SENTINEL} found, skipping database initialization")
 
 # UI Definition
 app_ui = ui.page_sidebar(
@@ -288,7 +553,7 @@ app_ui = ui.page_sidebar(
         ui.input_select(
             "model_selector",
             "Selecionar Modelo:",
-            choices={key: config.name for key, config in MODEL_CONFIGS.items()},
+            choices=_MODEL_KEY_TO_NAME,
             selected=list(MODEL_CONFIGS.keys())[0]
         ),
         ui.input_checkbox(
@@ -415,64 +680,25 @@ def server(input, output, session):
         logger.info("Setting process choices.")
         ui.update_select("process_selector", choices=choices)
     
+    @reactive.extended_task
+    async def load_case_task(filename, model_name, include_annotated):
+        """Run the parquet/DB loading off the event loop so the UI stays responsive."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_IO_POOL, load_case, filename, model_name, include_annotated)
+    
     @reactive.effect
     def load_current_data():
         """Load data when process or model selection changes."""
-        logger.info("Loading current data")
-        if not input.process_selector():
-            logger.info("No process selected, skipping data load")
-            current_data.set(None)
-            current_text.set("")
-            is_already_validated.set(False)
-            return
-            
-        model_name = MODEL_CONFIGS[input.model_selector()].name
-        logger.info(f"Loading data for process: {input.process_selector()}, model: {model_name}")
-        df = load_extracted_data(input.process_selector(), model_name)
-        
-        if not df.empty:
-            logger.info(f"Loaded {len(df)} records from extracted data")
-            
-            # Get first case (could be validated or not)
-            selected_case = df.iloc[0]
-            processo_num = selected_case['processo']
-            
-            # Check if this specific case is already validated
-            case_validated = is_case_validated(processo_num, model_name)
-            logger.info(f"Case {processo_num} validation status: {case_validated}")
-            
-            # If case is validated and user doesn't want to include annotated cases
-            if case_validated and not input.include_annotated():
-                logger.info(f"Case {processo_num} already validated and include_annotated is False")
-                is_already_validated.set(True)
-                current_data.set(selected_case)  # Still set data for processo info
-                current_text.set("Caso já anotado para este modelo")
-                return
-            
-            # Normal case - either not validated or user wants to include annotated
-            is_already_validated.set(False)
-            logger.info(f"Selected case: processo {processo_num}")
-            current_data.set(selected_case)
-            
-            # Load corresponding text
-            textos_df = load_textos_data()
-            if not textos_df.empty:
-                logger.info(f"Looking for text for processo {processo_num}")
-                text_row = textos_df[textos_df['processo'] == processo_num]
-                if not text_row.empty:
-                    logger.info(f"Found text with {len(text_row.iloc[0]['txt_sentencas'])} characters")
-                    current_text.set(text_row.iloc[0]['txt_sentencas'])
-                else:
-                    logger.warning(f"No text found for processo {processo_num}")
-                    current_text.set("Texto não encontrado para este processo")
-            else:
-                logger.warning("No textos data available")
-                current_text.set("Dados de texto não disponíveis")
-        else:
-            logger.info("No data available for selected process/model")
-            current_data.set(None)
-            current_text.set("Nenhum dado disponível")
-            is_already_validated.set(False)
+        model_name = _MODEL_KEY_TO_NAME[input.model_selector()]
+        load_case_task.invoke(input.process_selector(), model_name, input.include_annotated())
+    
+    @reactive.effect
+    def apply_loaded_case():
+        """Publish the loaded case once the background load finishes."""
+        data, text, already_validated = load_case_task.result()
+        current_data.set(data)
+        current_text.set(text)
+        is_already_validated.set(already_validated)
     
     @output
     @render.text
@@ -493,33 +719,7 @@ def server(input, output, session):
                      style="text-align: center; color: #666;")
             )
         
-        raw_text = current_text.get()
-        metadata_content, files_list = parse_input_text(raw_text)
-        
-        accordion_items = []
-        
-        # Add metadata accordion item
-        if metadata_content:
-            accordion_items.append(
-                ui.accordion_panel(
-                    "📋 Metadados",
-                    ui.pre(metadata_content, style="font-size: 11px; line-height: 1.3; margin: 0; white-space: pre-wrap;")
-                )
-            )
-        
-        # Add file accordion items
-        for file_info in files_list:
-            accordion_items.append(
-                ui.accordion_panel(
-                    f"📄 {file_info['filename']}",
-                    ui.pre(file_info['content'], style="font-size: 11px; line-height: 1.3; margin: 0; white-space: pre-wrap;")
-                )
-            )
-        
-        if not accordion_items:
-            return ui.p("Nenhum conteúdo disponível")
-        
-        return ui.accordion(*accordion_items, id="input_accordion", open=False)
+        return build_input_accordion(current_text.get())
     
     @output
     @render.ui
@@ -657,17 +857,19 @@ def server(input, output, session):
         claim_values = {}
         claim_relevance = {}
         
+        claim_fields = (
+            ("claim_relevance", claim_relevance),
+            ("claim_outcome", claim_outcomes),
+            ("claim_value", claim_values),
+        )
+        
         for i in range(len(claims)):
-            relevance_input = f"claim_relevance_{i}"
-            outcome_input = f"claim_outcome_{i}"
-            value_input = f"claim_value_{i}"
-            
-            if hasattr(input, relevance_input):
-                claim_relevance[i] = getattr(input, relevance_input)()
-            if hasattr(input, outcome_input):
-                claim_outcomes[i] = getattr(input, outcome_input)()
-            if hasattr(input, value_input):
-                claim_values[i] = getattr(input, value_input)()
+            for prefix, values in claim_fields:
+                # Inputs not yet received from the client raise SilentException when read
+                try:
+                    values[i] = input[f"{prefix}_{i}"]()
+                except SilentException:
+                    pass
         
         validation_data = {
             'processo': data['processo'],
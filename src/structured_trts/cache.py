@@ -0,0 +1,69 @@
+"""
+Cache em disco das extrações, endereçado pelo conteúdo da requisição
+"""
+from __future__ import annotations
+from typing import Optional
+from pathlib import Path
+from datetime import datetime, timezone
+import hashlib
+import json
+import os
+import tempfile
+
+
+def extraction_key(provider: str, model_id: str, temperature: float, prompt: str, text: str) -> str:
+    """
+    Chave sha256 de uma requisição de extração
+
+    Cada parte entra prefixada pelo seu tamanho, para que partes diferentes
+    não possam produzir a mesma sequência de bytes.
+
+    Returns:
+        str: hash hexadecimal da requisição
+    """
+    h = hashlib.sha256()
+    for part in (provider, model_id, repr(float(temperature)), prompt, text):
+        data = part.encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """Cache de extrações em arquivos JSON `{key[:2]}/{key}.json` dentro de `cache_dir`."""
+
+    def __init__(self, cache_dir: str | Path):
+        self.cache_dir = Path(cache_dir)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Entrada guardada para a chave
+
+        Returns:
+            dict | None: `{"data": ..., "meta": ...}`, ou None se não houver entrada legível
+        """
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def set(self, key: str, data: dict, meta: Optional[dict] = None) -> None:
+        """Guarda a extração e seus metadados; a escrita é atômica, então leitores nunca veem arquivo parcial."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {
+            "data": data,
+            "meta": {**(meta or {}), "utc_ts": datetime.now(timezone.utc).isoformat()},
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
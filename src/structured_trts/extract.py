@@ -5,16 +5,29 @@ Extraction module for structured data from labor court sentences.
 from __future__ import annotations
 from typing import Literal, List, Optional
 from enum import Enum
+import os
 import time
-import json
-from pydantic import BaseModel, Field
-from tqdm import tqdm
+import asyncio
+import hashlib
+import logging
+import weakref
+import orjson
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import BaseModel, ConfigDict, Field
+from tqdm.asyncio import tqdm_asyncio
 import tiktoken
+import numpy as np
 import pandas as pd
-from openai import OpenAI
-from groq import Groq
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openai import OpenAI, AsyncOpenAI, pydantic_function_tool
+from groq import Groq, AsyncGroq
 from google import genai
 from google.genai import types
+from .cache import ExtractionCache, extraction_key
+
+logger = logging.getLogger(__name__)
 
 # ---------- Enums: taxonomias e estados ----------
 
@@ -42,7 +55,7 @@ class Reflexos(Enum):
     SIM = "sim"
     NAO = "nao"
 
-class ClaimType(Enum):
+class ClaimType(str, Enum):
     """Tipo de pedido."""
     AVISO_PREVIO_13994 = "(13994) Aviso Prévio"
     INTEGRACAO_EM_VERBAS_RESCISORIAS_13924 = "(13924) Integração em Verbas Rescisórias"
@@ -161,37 +174,49 @@ class ClaimType(Enum):
     PLANO_DE_CARGOS_E_SALARIOS_13929 = "(13929) Plano de Cargos e Salários"
     CONTRATO_POR_PRAZO_DETERMINADO_13715 = "(13715) Contrato por Prazo Determinado"
 
+    def __init__(self, value: str):
+        # código e descrição calculados uma vez, na criação do membro; value é '(####) Descrição'
+        end = value.index(')')
+        self._code = int(value[1:end])
+        self._description = value[end + 2:]
+
     # --- helpers úteis ---
     @property
     def code(self) -> int:
-        """Retorna o código inteiro do item, extraindo do value '(####) Descrição'."""
-        # value começa com '(' + dígitos + ') '
-        return int(self.value[1:self.value.find(')')])
+        """Retorna o código inteiro do item, extraído do value '(####) Descrição'."""
+        return self._code
 
     @property
     def description(self) -> str:
         """Retorna a descrição sem o código."""
-        return self.value[self.value.find(')') + 2 :]
+        return self._description
 
     @classmethod
     def from_code(cls, code: int) -> "ClaimType":
         """Obtém o Enum pelo código. Lança KeyError se não existir."""
-        for item in cls:
-            if item.code == int(code):
-                return item
-        raise KeyError(f"Código não mapeado no ClaimType: {code}")
+        try:
+            return cls._BY_CODE[int(code)]
+        except KeyError:
+            raise KeyError(f"Código não mapeado no ClaimType: {code}") from None
+
+ClaimType._BY_CODE = {member.code: member for member in ClaimType}
 
 
 # ---------- Tipos de apoio ----------
 
+# Os modelos extraídos são imutáveis depois de validados: só são lidos e serializados
+# (via `model_dump_json`, no serializador do pydantic-core)
+
 class Money(BaseModel):
     """Representa um valor monetário."""
+    model_config = ConfigDict(frozen=True)
     amount: float = Field(description="Valor monetário em reais")
     currency: str = Field(description="Moeda utilizada (geralmente BRL)")
     is_liquidacao: Optional[bool] = Field(description="Indica se o valor é de liquidação")
 
 class ClaimDecision(BaseModel):
     """Decisão por pedido (núcleo da extração)."""
+    model_config = ConfigDict(frozen=True)
     claim_type: ClaimType = Field(description="Tipo de pedido, extraído dos metadados do processo ou da decisão")
     outcome: DecisionOutcome = Field(description="Resultado da decisão, extraído do texto da decisão, provavelmente na parte do dispositivo ou da fundamentação/decisão")
     valor_recebido: Optional[Money] = Field(description="Valor de indenização ou do acordo celebrado, específico do pedido, extraído do texto da decisão, provavelmente na parte do dispositivo ou da fundamentação/decisão")
@@ -199,12 +224,22 @@ class ClaimDecision(BaseModel):
 
 class LaborSentenceExtraction(BaseModel):
     """Representa a extração de uma sentença em processo trabalhista."""
+    model_config = ConfigDict(frozen=True)
     decision_type: DecisionType = Field(description="Tipo de decisão, extraído do texto da decisão, provavelmente na parte do dispositivo ou da fundamentação/decisão")
     claims: List[ClaimDecision] = Field(description="Lista de pedidos e suas decisões, extraídos de todo o conteúdo da entrada")
     custas: Optional[Money] = Field(description="Valor das custas processuais aplicadas ao caso, extraído do texto da decisão")
     gratuidade: Optional[Gratuidade] = Field(description="Indica se a gratuidade foi concedida ao trabalhador, extraído do texto da decisão")
     valor_total_decisao: Optional[Money] = Field(description="Valor de indenização total ou valor do acordo total, extraído dos textos disponíveis")
 
+class PackedDocumentExtraction(BaseModel):
+    """Extração de um dos documentos enviados juntos na mesma requisição."""
+    documento: int = Field(description="Número do documento, conforme a tag <documento numero=...> da entrada")
+    extraction: LaborSentenceExtraction = Field(description="Extração referente a esse documento")
+
+class PackedExtraction(BaseModel):
+    """Extrações de vários documentos enviados na mesma requisição."""
+    documentos: List[PackedDocumentExtraction] = Field(description="Uma extração para cada documento da entrada")
+
 class ExtractionResult(BaseModel):
     """Resultado da extração."""
     model_name: str
@@ -227,138 +262,480 @@ class ModelConfig(BaseModel):
     temperature: float = 0.0
     price_input_1M: float = 0.0
     price_output_1M: float = 0.0
+    # limites da conta para o modelo; None usa os limites passados à extração em lote
+    max_concurrency: Optional[int] = None
+    rpm: Optional[int] = None
 
-# Predefined model configurations
+# Predefined model configurations; `max_tokens` stays within each model's completion limit
+# on its provider (the Groq Llama 4 models reject requests above 8192)
 MODEL_CONFIGS = {
-    "gpt-4.1": ModelConfig(name="OpenAI GPT-4.1", provider="openai", model_id="gpt-4.1", temperature=0.0, price_input_1M=3.0, price_output_1M=12.0),
-    "gpt-4.1-mini": ModelConfig(name="OpenAI GPT-4.1-mini", provider="openai", model_id="gpt-4.1-mini", temperature=0.0, price_input_1M=0.8, price_output_1M=3.2),
-    "gpt-4.1-nano": ModelConfig(name="OpenAI GPT-4.1-nano", provider="openai", model_id="gpt-4.1-nano", temperature=0.0, price_input_1M=0.2, price_output_1M=0.8),
-    "gemini-2.5-pro": ModelConfig(name="Gemini 2.5 Pro", provider="gemini", model_id="gemini-2.5-pro", temperature=0.0, price_input_1M=1.25, price_output_1M=10.0),
-    "gemini-2.5-flash": ModelConfig(name="Gemini 2.5 Flash", provider="gemini", model_id="gemini-2.5-flash", temperature=0.0, price_input_1M=0.3, price_output_1M=2.5),
-    "gpt-oss-120b": ModelConfig(name="GPT OSS 120B", provider="groq", model_id="openai/gpt-oss-120b", temperature=0.0, price_input_1M=0.15, price_output_1M=0.75),
-    "gpt-oss-20b": ModelConfig(name="GPT OSS 20B", provider="groq", model_id="openai/gpt-oss-20b", temperature=0.0, price_input_1M=0.10, price_output_1M=0.50),
-    "llama-4-maverick": ModelConfig(name="Llama 4 Maverick", provider="groq", model_id="meta-llama/llama-4-maverick-17b-128e-instruct", temperature=0.0, price_input_1M=0.20, price_output_1M=0.60),
-    "llama-4-scout": ModelConfig(name="Llama 4 Scout", provider="groq", model_id="meta-llama/llama-4-scout-17b-16e-instruct", temperature=0.0, price_input_1M=0.11, price_output_1M=0.34),
-    "kimi-k2": ModelConfig(name="Kimi K2", provider="groq", model_id="moonshotai/kimi-k2-instruct", temperature=0.0, price_input_1M=1.0, price_output_1M=3.0),
+    "gpt-4.1": ModelConfig(name="OpenAI GPT-4.1", provider="openai", model_id="gpt-4.1", max_tokens=16384, temperature=0.0, price_input_1M=3.0, price_output_1M=12.0),
+    "gpt-4.1-mini": ModelConfig(name="OpenAI GPT-4.1-mini", provider="openai", model_id="gpt-4.1-mini", max_tokens=16384, temperature=0.0, price_input_1M=0.8, price_output_1M=3.2),
+    "gpt-4.1-nano": ModelConfig(name="OpenAI GPT-4.1-nano", provider="openai", model_id="gpt-4.1-nano", max_tokens=16384, temperature=0.0, price_input_1M=0.2, price_output_1M=0.8),
+    "gemini-2.5-pro": ModelConfig(name="Gemini 2.5 Pro", provider="gemini", model_id="gemini-2.5-pro", max_tokens=16384, temperature=0.0, price_input_1M=1.25, price_output_1M=10.0),
+    "gemini-2.5-flash": ModelConfig(name="Gemini 2.5 Flash", provider="gemini", model_id="gemini-2.5-flash", max_tokens=16384, temperature=0.0, price_input_1M=0.3, price_output_1M=2.5),
+    "gpt-oss-120b": ModelConfig(name="GPT OSS 120B", provider="groq", model_id="openai/gpt-oss-120b", max_tokens=16384, temperature=0.0, price_input_1M=0.15, price_output_1M=0.75),
+    "gpt-oss-20b": ModelConfig(name="GPT OSS 20B", provider="groq", model_id="openai/gpt-oss-20b", max_tokens=16384, temperature=0.0, price_input_1M=0.10, price_output_1M=0.50),
+    "llama-4-maverick": ModelConfig(name="Llama 4 Maverick", provider="groq", model_id="meta-llama/llama-4-maverick-17b-128e-instruct", max_tokens=8192, temperature=0.0, price_input_1M=0.20, price_output_1M=0.60),
+    "llama-4-scout": ModelConfig(name="Llama 4 Scout", provider="groq", model_id="meta-llama/llama-4-scout-17b-16e-instruct", max_tokens=8192, temperature=0.0, price_input_1M=0.11, price_output_1M=0.34),
+    "kimi-k2": ModelConfig(name="Kimi K2", provider="groq", model_id="moonshotai/kimi-k2-instruct", max_tokens=16384, temperature=0.0, price_input_1M=1.0, price_output_1M=3.0),
 }
 
+# Esquema das linhas de resultado gravadas em parquet; `extracted_data` vai como JSON
+# para que o esquema não dependa de quais campos opcionais vieram preenchidos
+RESULTS_SCHEMA = pa.schema([
+    ("processo", pa.string()),
+    ("model_name", pa.string()),
+    ("provider", pa.string()),
+    ("prompt_hash", pa.string()),
+    ("input_tokens", pa.int64()),
+    ("output_tokens", pa.int64()),
+    ("extraction_time_seconds", pa.float64()),
+    ("success", pa.bool_()),
+    ("error_message", pa.string()),
+    ("extracted_data", pa.string()),
+])
+# Colunas de poucos valores distintos, gravadas com dicionário no parquet; `processo` e
+# `extracted_data` são quase únicos por linha e o dicionário só custaria hashing
+_RESULTS_DICTIONARY_COLUMNS = ["model_name", "provider", "prompt_hash", "error_message"]
+
 # ---------- Extraction Functions ----------
 
-def load_prompt(prompt_path: str) -> str:
-    """Carrega o prompt do arquivo."""
+# Limites de cada requisição, para que uma chamada travada não prenda um slot de concorrência:
+# timeout em segundos, novas tentativas e teto de tokens de saída para modelos que não definem
+# `max_tokens` (folgado porque o raciocínio do Gemini 2.5 e do gpt-oss conta nesse teto; os
+# modelos de `MODEL_CONFIGS` definem o seu, dentro do limite de cada provedor)
+REQUEST_TIMEOUT_SECONDS = 120
+REQUEST_MAX_RETRIES = 3
+DEFAULT_MAX_OUTPUT_TOKENS = 16384
+
+def _gemini_http_options() -> types.HttpOptions:
+    return types.HttpOptions(
+        timeout=REQUEST_TIMEOUT_SECONDS * 1000,  # em milissegundos
+        retry_options=types.HttpRetryOptions(attempts=REQUEST_MAX_RETRIES + 1)
+    )
+
+@lru_cache(maxsize=None)
+def _get_client(provider: str):
+    """
+    Cliente do provedor, criado uma vez por processo e reutilizado (mantém o pool de conexões HTTP).
+
+    Criado no primeiro uso, para que a chave de API venha do ambiente já carregado. Os clientes
+    síncronos podem ser compartilhados entre threads; para asyncio, use `_get_async_client`.
+    """
+    if provider == "openai":
+        return OpenAI(timeout=REQUEST_TIMEOUT_SECONDS, max_retries=REQUEST_MAX_RETRIES)
+    elif provider == "gemini":
+        return genai.Client(http_options=_gemini_http_options())
+    elif provider == "groq":
+        return Groq(timeout=REQUEST_TIMEOUT_SECONDS, max_retries=REQUEST_MAX_RETRIES)
+    raise ValueError(f"Unsupported provider: {provider}")
+
+# As conexões dos clientes assíncronos ficam presas ao event loop em que foram abertas,
+# então há um conjunto de clientes por loop (descartado junto com o loop)
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+
+def _get_async_client(provider: str):
+    """Cliente assíncrono do provedor, reutilizado dentro do event loop atual."""
+    clients = _ASYNC_CLIENTS.setdefault(asyncio.get_running_loop(), {})
+    if provider not in clients:
+        if provider == "openai":
+            clients[provider] = AsyncOpenAI(timeout=REQUEST_TIMEOUT_SECONDS, max_retries=REQUEST_MAX_RETRIES)
+        elif provider == "gemini":
+            clients[provider] = genai.Client(http_options=_gemini_http_options()).aio
+        elif provider == "groq":
+            clients[provider] = AsyncGroq(timeout=REQUEST_TIMEOUT_SECONDS, max_retries=REQUEST_MAX_RETRIES)
+        else:
+            raise ValueError(f"Unsupported provider: {provider}")
+    return clients[provider]
+
+async def _aclose_async_clients() -> None:
+    """Fecha os clientes assíncronos do event loop atual, liberando seus pools de conexões HTTP."""
+    clients = _ASYNC_CLIENTS.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        # os clientes do OpenAI e do Groq têm `close`; o `.aio` do genai, `aclose`
+        await (client.aclose() if hasattr(client, "aclose") else client.close())
+
+@lru_cache(maxsize=None)
+def _get_enc(model_name: str = "gpt-4o") -> tiktoken.Encoding:
+    """Tokenizador carregado uma única vez por processo (sob demanda, para não exigir rede no import)."""
+    return tiktoken.encoding_for_model(model_name)
+
+@lru_cache(maxsize=32)
+def _load_prompt_cached(prompt_path: str, mtime_ns: int) -> str:
     with open(prompt_path, 'r', encoding='utf-8') as f:
         return f.read()
 
+def load_prompt(prompt_path: str) -> str:
+    """Carrega o prompt do arquivo (em cache enquanto o arquivo não for modificado)."""
+    return _load_prompt_cached(prompt_path, os.stat(prompt_path).st_mtime_ns)
+
 def token_count(text: str) -> int:
-    """Contagem de tokens."""
-    enc = tiktoken.encoding_for_model("gpt-4o")
-    return len(enc.encode(text))
+    """Contagem de tokens; tokens especiais no texto (como `<|endoftext|>`) contam como texto comum, sem erro."""
+    return len(_get_enc().encode_ordinary(text))
+
+def token_count_batch(texts: List[str]) -> List[int]:
+    """Contagem de tokens em lote, paralelizada nas threads do tokenizador."""
+    return [len(tokens) for tokens in _get_enc().encode_ordinary_batch(texts, num_threads=os.cpu_count() or 1)]
+
+# Faixa heurística de caracteres por token do BPE em texto comum: com menos de
+# `max_tokens * 2` caracteres o texto é aceito sem tokenizar, com mais de `max_tokens * 6`
+# é descartado. Não é garantia: tabelas, sequências de dígitos e ruído de OCR podem ficar
+# abaixo de 2 caracteres por token e passar do limite sem serem contados
+_MIN_CHARS_PER_TOKEN = 2
+_MAX_CHARS_PER_TOKEN = 6
 
-def extract_with_direct_api(text: str, prompt: str, model_key: str) -> ExtractionResult:
+def _within_token_limit(texts: pd.Series, max_tokens: int) -> np.ndarray:
+    """
+    Máscara aproximada dos textos com menos de `max_tokens` tokens
+
+    Só os textos de tamanho duvidoso são tokenizados; os demais são decididos pela
+    heurística de caracteres por token, que pode errar em textos atípicos (tabelas, OCR).
+    """
+    n_chars = texts.fillna("").str.len().to_numpy()
+    keep = n_chars < max_tokens * _MIN_CHARS_PER_TOKEN
+    borderline = np.flatnonzero(~keep & (n_chars <= max_tokens * _MAX_CHARS_PER_TOKEN))
+    if borderline.size:
+        keep[borderline] = np.asarray(token_count_batch(texts.iloc[borderline].tolist())) < max_tokens
+    return keep
+
+def _success_result(model_config: ModelConfig, result: dict, start_time: float) -> ExtractionResult:
+    return ExtractionResult(
+        model_name=model_config.name,
+        provider=model_config.provider,
+        input_tokens=result['input_tokens'],
+        output_tokens=result['output_tokens'],
+        extraction_time_seconds=time.time() - start_time,
+        success=True,
+        extracted_data=result["data"]
+    )
+
+def _failure_result(model_config: ModelConfig, input_tokens: int, start_time: float, error: Exception) -> ExtractionResult:
+    return ExtractionResult(
+        model_name=model_config.name,
+        provider=model_config.provider,
+        input_tokens=input_tokens,
+        output_tokens=0,
+        extraction_time_seconds=time.time() - start_time,
+        success=False,
+        error_message=str(error)
+    )
+
+def _cache_key(text: str, prompt: str, model_config: ModelConfig) -> str:
+    return extraction_key(model_config.provider, model_config.model_id, model_config.temperature, prompt, text)
+
+def _cached_result(cache: ExtractionCache, key: str, model_config: ModelConfig) -> Optional[ExtractionResult]:
+    """Resultado reconstruído do cache, ou None se não houver entrada válida para o esquema atual."""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    try:
+        extracted_data = LaborSentenceExtraction.model_validate(entry["data"])
+    except Exception:
+        return None
+    meta = entry.get("meta", {})
+    return ExtractionResult(
+        model_name=model_config.name,
+        provider=model_config.provider,
+        input_tokens=meta.get("input_tokens", 0),
+        output_tokens=meta.get("output_tokens", 0),
+        extraction_time_seconds=0,
+        success=True,
+        extracted_data=extracted_data
+    )
+
+def _store_result(cache: ExtractionCache, key: str, model_config: ModelConfig, result: ExtractionResult) -> None:
+    """Guarda a extração no cache; uma falha de escrita só é registrada, sem perder a extração já paga."""
+    if not (result.success and result.extracted_data is not None):
+        return
+    try:
+        cache.set(key, result.extracted_data.model_dump(mode="json"), meta={
+            "provider": model_config.provider,
+            "model_id": model_config.model_id,
+            "input_tokens": result.input_tokens,
+            "output_tokens": result.output_tokens,
+        })
+    except Exception as e:
+        logger.warning(f"Failed to write extraction cache entry {key}: {e}")
+
+def _fallback_input_tokens(text: str, prompt: str, prompt_tokens: Optional[int]) -> int:
+    """Contagem local de tokens de entrada, usada só quando o modelo falha (a API não informa o uso)."""
+    return (token_count(prompt) if prompt_tokens is None else prompt_tokens) + token_count(text)
+
+def extract_with_direct_api(
+    text: str,
+    prompt: str,
+    model_key: str,
+    prompt_tokens: Optional[int] = None,
+    cache: Optional[ExtractionCache] = None
+) -> ExtractionResult:
     """
     Extração de dados usando APIs diretas (OpenAI, Google, Groq).
+
+    Se o modelo falhar, `input_tokens` é contado localmente; `prompt_tokens` evita
+    recontar o prompt quando ele já é conhecido.
+    Com `cache`, requisições idênticas (provedor, modelo, temperatura, prompt e texto)
+    já extraídas são servidas do disco, sem chamar a API.
     """
     start_time = time.time()
     model_config = MODEL_CONFIGS[model_key]
-    # token count if model fails
-    input_tokens = token_count(prompt + text)
-    
+    if cache is not None:
+        key = _cache_key(text, prompt, model_config)
+        cached = _cached_result(cache, key, model_config)
+        if cached is not None:
+            return cached
     try:
-        if model_config.provider == "openai":
-            result = _extract_openai(text, prompt, model_config)            
-        elif model_config.provider == "gemini":
-            result = _extract_gemini(text, prompt, model_config)
-        elif model_config.provider == "groq":
-            result = _extract_groq(text, prompt, model_config)
+        result = _success_result(model_config, _extract(text, prompt, model_config), start_time)
+    except Exception as e:
+        # token count only if model fails
+        return _failure_result(model_config, _fallback_input_tokens(text, prompt, prompt_tokens), start_time, e)
+    if cache is not None:
+        _store_result(cache, key, model_config, result)
+    return result
+
+async def aextract_with_direct_api(
+    text: str,
+    prompt: str,
+    model_key: str,
+    prompt_tokens: Optional[int] = None,
+    cache: Optional[ExtractionCache] = None
+) -> ExtractionResult:
+    """Versão assíncrona de `extract_with_direct_api`, com os clientes assíncronos dos SDKs."""
+    start_time = time.time()
+    model_config = MODEL_CONFIGS[model_key]
+    if cache is not None:
+        key = _cache_key(text, prompt, model_config)
+        cached = _cached_result(cache, key, model_config)
+        if cached is not None:
+            return cached
+    try:
+        result = _success_result(model_config, await _aextract(text, prompt, model_config), start_time)
+    except Exception as e:
+        # token count only if model fails
+        return _failure_result(model_config, _fallback_input_tokens(text, prompt, prompt_tokens), start_time, e)
+    if cache is not None:
+        _store_result(cache, key, model_config, result)
+    return result
+
+PACKED_PROMPT_SUFFIX = """
+
+A entrada contém vários processos, cada um delimitado por <documento numero=N> ... </documento>.
+Extraia cada documento de forma independente e retorne uma extração para cada um, informando seu número em `documento`."""
+
+def _pack_texts(texts: List[str]) -> str:
+    return "\n\n".join(
+        f"<documento numero={i}>\n{text}\n</documento>" for i, text in enumerate(texts)
+    )
+
+def _unpack_results(
+    model_config: ModelConfig,
+    result: Optional[dict],
+    error: Optional[Exception],
+    input_tokens: List[int],
+    start_time: float
+) -> List[ExtractionResult]:
+    """Separa a resposta de uma requisição com vários documentos em um resultado por documento."""
+    extractions = {}
+    error_message = str(error) if error else "Documento ausente na resposta"
+    if result is not None:
+        try:
+            for document in PackedExtraction.model_validate(result["data"]).documentos:
+                extractions.setdefault(document.documento, document.extraction)
+        except Exception as e:
+            error_message = str(e)
+
+    elapsed = time.time() - start_time
+    total_tokens = sum(input_tokens) or 1
+    results = []
+    for i, n_tokens in enumerate(input_tokens):
+        share = n_tokens / total_tokens
+        if i in extractions:
+            results.append(ExtractionResult(
+                model_name=model_config.name,
+                provider=model_config.provider,
+                input_tokens=round(result["input_tokens"] * share),
+                output_tokens=round(result["output_tokens"] * share),
+                extraction_time_seconds=elapsed,
+                success=True,
+                extracted_data=extractions[i]
+            ))
         else:
-            raise ValueError(f"Unsupported provider: {model_config.provider}")
-
-        return ExtractionResult(
-            model_name=model_config.name,
-            provider=model_config.provider,
-            input_tokens=result['input_tokens'],
-            output_tokens=result['output_tokens'],
-            extraction_time_seconds=time.time() - start_time,
-            success=True,
-            extracted_data=result["data"]
-        )
-        
+            results.append(ExtractionResult(
+                model_name=model_config.name,
+                provider=model_config.provider,
+                input_tokens=n_tokens,
+                output_tokens=0,
+                extraction_time_seconds=elapsed,
+                success=False,
+                error_message=error_message
+            ))
+    return results
+
+def extract_packed_with_direct_api(
+    texts: List[str],
+    prompt: str,
+    model_key: str,
+    input_tokens: List[int]
+) -> List[ExtractionResult]:
+    """
+    Extração de vários textos em uma única requisição, para amortizar o limite de requisições por minuto.
+
+    Retorna um resultado por texto, na mesma ordem. Os tokens informados pela API são
+    repartidos entre os documentos proporcionalmente a `input_tokens`, a contagem
+    usada nos que falharem.
+    """
+    start_time = time.time()
+    model_config = MODEL_CONFIGS[model_key]
+    try:
+        result = _extract(_pack_texts(texts), prompt + PACKED_PROMPT_SUFFIX, model_config, PackedExtraction)
+        return _unpack_results(model_config, result, None, input_tokens, start_time)
     except Exception as e:
-        return ExtractionResult(
-            model_name=model_config.name,
-            provider=model_config.provider,
-            input_tokens=input_tokens,
-            output_tokens=0,
-            extraction_time_seconds=time.time() - start_time,
-            success=False,
-            error_message=str(e)
-        )
+        return _unpack_results(model_config, None, e, input_tokens, start_time)
 
-def _extract_openai(text: str, prompt: str, model_config: ModelConfig) -> dict:
-    """Extração usando OpenAI Responses API."""
-    client = OpenAI()
+async def aextract_packed_with_direct_api(
+    texts: List[str],
+    prompt: str,
+    model_key: str,
+    input_tokens: List[int]
+) -> List[ExtractionResult]:
+    """Versão assíncrona de `extract_packed_with_direct_api`."""
+    start_time = time.time()
+    model_config = MODEL_CONFIGS[model_key]
+    try:
+        result = await _aextract(_pack_texts(texts), prompt + PACKED_PROMPT_SUFFIX, model_config, PackedExtraction)
+        return _unpack_results(model_config, result, None, input_tokens, start_time)
+    except Exception as e:
+        return _unpack_results(model_config, None, e, input_tokens, start_time)
 
-    response = client.responses.parse(
+def _extract(text: str, prompt: str, model_config: ModelConfig, response_model: type[BaseModel] = LaborSentenceExtraction) -> dict:
+    """Encaminha a extração para a função do provedor do modelo."""
+    if model_config.provider == "openai":
+        return _extract_openai(text, prompt, model_config, response_model)
+    elif model_config.provider == "gemini":
+        return _extract_gemini(text, prompt, model_config, response_model)
+    elif model_config.provider == "groq":
+        return _extract_groq(text, prompt, model_config, response_model)
+    else:
+        raise ValueError(f"Unsupported provider: {model_config.provider}")
+
+async def _aextract(text: str, prompt: str, model_config: ModelConfig, response_model: type[BaseModel] = LaborSentenceExtraction) -> dict:
+    """Versão assíncrona de `_extract`."""
+    if model_config.provider == "openai":
+        return await _aextract_openai(text, prompt, model_config, response_model)
+    elif model_config.provider == "gemini":
+        return await _aextract_gemini(text, prompt, model_config, response_model)
+    elif model_config.provider == "groq":
+        return await _aextract_groq(text, prompt, model_config, response_model)
+    else:
+        raise ValueError(f"Unsupported provider: {model_config.provider}")
+
+# Cada provedor tem os argumentos da requisição e a leitura da resposta separados,
+# compartilhados pelas versões síncrona e assíncrona
+
+def _openai_request(text: str, prompt: str, model_config: ModelConfig, response_model: type[BaseModel]) -> dict:
+    return dict(
         model=model_config.model_id,
         instructions=prompt,
         input=text,
-        text_format=LaborSentenceExtraction,
-        temperature=model_config.temperature
+        text_format=response_model,
+        temperature=model_config.temperature,
+        max_output_tokens=model_config.max_tokens or DEFAULT_MAX_OUTPUT_TOKENS
     )
 
+def _openai_response(response) -> dict:
+    # o SDK já devolve a instância validada do modelo de resposta
+    if response.output_parsed is None:
+        raise ValueError("Resposta sem saída estruturada")
     return {
-        "data": json.loads(response.output_parsed.model_dump_json()),
+        "data": response.output_parsed,
         "input_tokens": getattr(response.usage, 'input_tokens', 0) if hasattr(response, 'usage') else 0,
         "output_tokens": getattr(response.usage, 'output_tokens', 0) if hasattr(response, 'usage') else 0
     }
 
-def _extract_gemini(text: str, prompt: str, model_config: ModelConfig) -> dict:
-    """Extração usando Google Gemini API."""
-    client = genai.Client()
+def _extract_openai(text: str, prompt: str, model_config: ModelConfig, response_model: type[BaseModel] = LaborSentenceExtraction) -> dict:
+    """Extração usando OpenAI Responses API."""
+    client = _get_client("openai")
+    response = client.responses.parse(**_openai_request(text, prompt, model_config, response_model))
+    return _openai_response(response)
 
-    response = client.models.generate_content(
+async def _aextract_openai(text: str, prompt: str, model_config: ModelConfig, response_model: type[BaseModel] = LaborSentenceExtraction) -> dict:
+    """Extração usando OpenAI Responses API (cliente assíncrono)."""
+    client = _get_async_client("openai")
+    response = await client.responses.parse(**_openai_request(text, prompt, model_config, response_model))
+    return _openai_response(response)
+
+@lru_cache(maxsize=None)
+def _gemini_config(prompt: str, temperature: float, max_output_tokens: int, response_model: type[BaseModel]) -> types.GenerateContentConfig:
+    """`GenerateContentConfig` do Gemini, montado uma vez por prompt e modelo, não a cada requisição."""
+    return types.GenerateContentConfig(
+        system_instruction=prompt,
+        temperature=temperature,
+        max_output_tokens=max_output_tokens,
+        response_mime_type="application/json",
+        response_schema=response_model
+    )
+
+def _gemini_request(text: str, prompt: str, model_config: ModelConfig, response_model: type[BaseModel]) -> dict:
+    return dict(
         model=model_config.model_id,
         contents=text,
-        config=types.GenerateContentConfig(
-            system_instruction=prompt,
-            temperature=model_config.temperature,
-            response_mime_type="application/json",
-            response_schema=LaborSentenceExtraction
+        config=_gemini_config(
+            prompt,
+            model_config.temperature,
+            model_config.max_tokens or DEFAULT_MAX_OUTPUT_TOKENS,
+            response_model
         ),
     )
 
+def _gemini_response(response, response_model: type[BaseModel]) -> dict:
     prompt_tokens = getattr(response.usage_metadata, 'prompt_token_count', 0) if hasattr(response, 'usage_metadata') else 0
     thought_tokens = getattr(response.usage_metadata, 'thoughts_token_count', 0) if hasattr(response, 'usage_metadata') else 0
     candidate_tokens = getattr(response.usage_metadata, 'candidates_token_count', 0) if hasattr(response, 'usage_metadata') else 0
     output_tokens = thought_tokens + candidate_tokens
 
     return {
-        "data": json.loads(response.text),
+        "data": response_model.model_validate_json(response.text),
         "output_tokens": output_tokens,
         "input_tokens": prompt_tokens
     }
 
-def _extract_groq(text: str, prompt: str, model_config: ModelConfig) -> dict:
-    """Extração usando Groq API."""
-    client = Groq()
+def _extract_gemini(text: str, prompt: str, model_config: ModelConfig, response_model: type[BaseModel] = LaborSentenceExtraction) -> dict:
+    """Extração usando Google Gemini API."""
+    client = _get_client("gemini")
+    response = client.models.generate_content(**_gemini_request(text, prompt, model_config, response_model))
+    return _gemini_response(response, response_model)
 
-    response = client.chat.completions.create(
+async def _aextract_gemini(text: str, prompt: str, model_config: ModelConfig, response_model: type[BaseModel] = LaborSentenceExtraction) -> dict:
+    """Extração usando Google Gemini API (cliente assíncrono)."""
+    client = _get_async_client("gemini")
+    response = await client.models.generate_content(**_gemini_request(text, prompt, model_config, response_model))
+    return _gemini_response(response, response_model)
+
+@lru_cache(maxsize=None)
+def _groq_response_format(response_model: type[BaseModel]) -> dict:
+    """`response_format` do Groq; o JSON schema é gerado uma vez por modelo de resposta, não a cada requisição."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "labor_decision",
+            "schema": response_model.model_json_schema()
+        }
+    }
+
+def _groq_request(text: str, prompt: str, model_config: ModelConfig, response_model: type[BaseModel]) -> dict:
+    return dict(
         model=model_config.model_id,
         messages=[
             {"role": "system", "content": prompt},
             {"role": "user", "content": text},
         ],
-        response_format={
-            "type": "json_schema",
-            "json_schema": {
-                "name": "labor_decision",
-                "schema": LaborSentenceExtraction.model_json_schema()
-            }
-        },
-        temperature=model_config.temperature
+        response_format=_groq_response_format(response_model),
+        temperature=model_config.temperature,
+        max_tokens=model_config.max_tokens or DEFAULT_MAX_OUTPUT_TOKENS
     )
 
-    data = json.loads(response.choices[0].message.content)
+def _groq_response(response, response_model: type[BaseModel]) -> dict:
+    data = response_model.model_validate_json(response.choices[0].message.content)
 
     return {
         "data": data,
@@ -366,62 +743,528 @@ def _extract_groq(text: str, prompt: str, model_config: ModelConfig) -> dict:
         "input_tokens": getattr(response.usage, 'prompt_tokens', 0) if hasattr(response, 'usage') else 0
     }
 
-def run_extraction_batch(
+def _extract_groq(text: str, prompt: str, model_config: ModelConfig, response_model: type[BaseModel] = LaborSentenceExtraction) -> dict:
+    """Extração usando Groq API."""
+    client = _get_client("groq")
+    response = client.chat.completions.create(**_groq_request(text, prompt, model_config, response_model))
+    return _groq_response(response, response_model)
+
+async def _aextract_groq(text: str, prompt: str, model_config: ModelConfig, response_model: type[BaseModel] = LaborSentenceExtraction) -> dict:
+    """Extração usando Groq API (cliente assíncrono)."""
+    client = _get_async_client("groq")
+    response = await client.chat.completions.create(**_groq_request(text, prompt, model_config, response_model))
+    return _groq_response(response, response_model)
+
+_BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+# Limites de cada arquivo de entrada da Batch API: 50 mil requisições e 200MB; a margem
+# de bytes cobre a estimativa do envelope de cada linha
+_OPENAI_BATCH_MAX_REQUESTS = 50000
+_OPENAI_BATCH_MAX_BYTES = 180_000_000
+_OPENAI_BATCH_LINE_OVERHEAD_BYTES = 1_000
+
+@lru_cache(maxsize=None)
+def _openai_batch_text_format() -> dict:
+    """Formato de saída estrito (o mesmo que `responses.parse` gera), calculado uma única vez."""
+    # `pydantic_function_tool` é a API pública do SDK que gera o esquema estrito
+    return {
+        "type": "json_schema",
+        "name": "labor_decision",
+        "schema": pydantic_function_tool(LaborSentenceExtraction)["function"]["parameters"],
+        "strict": True,
+    }
+
+def extract_with_openai_batch(
+    texts: List[str],
+    prompt: str,
+    model_key: str,
+    input_tokens: List[int],
+    poll_seconds: float = 30.0
+) -> List[ExtractionResult]:
+    """
+    Extração de vários textos com um modelo OpenAI via Batch API (JSONL enviado, consultado até terminar).
+
+    Retorna um resultado por texto, na mesma ordem; `input_tokens` é a contagem usada nos que falharem.
+    """
+    start_time = time.time()
+    model_config = MODEL_CONFIGS[model_key]
+    client = _get_client("openai")
+    text_format = _openai_batch_text_format()
+    lines = [
+        orjson.dumps({
+            "custom_id": str(i),
+            "method": "POST",
+            "url": "/v1/responses",
+            "body": {
+                "model": model_config.model_id,
+                "instructions": prompt,
+                "input": text,
+                "text": {"format": text_format},
+                "temperature": model_config.temperature,
+                "max_output_tokens": model_config.max_tokens or DEFAULT_MAX_OUTPUT_TOKENS,
+            },
+        })
+        for i, text in enumerate(texts)
+    ]
+    errors = {}
+    outputs = {}
+    try:
+        batch_file = client.files.create(file=("batch.jsonl", b"\n".join(lines)), purpose="batch")
+        batch = client.batches.create(input_file_id=batch_file.id, endpoint="/v1/responses", completion_window="24h")
+        while batch.status not in _BATCH_TERMINAL_STATUSES:
+            time.sleep(poll_seconds)
+            batch = client.batches.retrieve(batch.id)
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in client.files.content(file_id).content.splitlines():
+                if not line.strip():
+                    continue
+                item = orjson.loads(line)
+                response = item.get("response") or {}
+                if response.get("status_code") == 200:
+                    outputs[int(item["custom_id"])] = response["body"]
+                else:
+                    errors[int(item["custom_id"])] = str(item.get("error") or response.get("body"))
+        missing_message = f"Batch {batch.id} terminou com status {batch.status}"
+    except Exception as e:
+        missing_message = str(e)
+
+    elapsed = time.time() - start_time
+    results = []
+    for i in range(len(texts)):
+        try:
+            if i not in outputs:
+                raise RuntimeError(errors.get(i, missing_message))
+            body = outputs[i]
+            output_text = next(
+                content["text"]
+                for item in body["output"] if item.get("type") == "message"
+                for content in item["content"] if content.get("type") == "output_text"
+            )
+            usage = body.get("usage") or {}
+            results.append(ExtractionResult(
+                model_name=model_config.name,
+                provider=model_config.provider,
+                input_tokens=usage.get("input_tokens", 0),
+                output_tokens=usage.get("output_tokens", 0),
+                extraction_time_seconds=elapsed,
+                success=True,
+                extracted_data=LaborSentenceExtraction.model_validate_json(output_text)
+            ))
+        except Exception as e:
+            results.append(ExtractionResult(
+                model_name=model_config.name,
+                provider=model_config.provider,
+                input_tokens=input_tokens[i],
+                output_tokens=0,
+                extraction_time_seconds=elapsed,
+                success=False,
+                error_message=str(e) or type(e).__name__
+            ))
+    return results
+
+_GEMINI_BATCH_TERMINAL_STATES = {
+    "JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"
+}
+# Requisições inline somam no máximo 20MB por job; a margem cobre o prompt e o esquema repetidos
+_GEMINI_BATCH_MAX_BYTES = 15_000_000
+_GEMINI_BATCH_REQUEST_OVERHEAD_BYTES = 32_000
+
+def extract_with_gemini_batch(
+    texts: List[str],
+    prompt: str,
+    model_key: str,
+    input_tokens: List[int],
+    poll_seconds: float = 30.0
+) -> List[ExtractionResult]:
+    """
+    Extração de vários textos com um modelo Gemini via Batch API (requisições inline, consultado até terminar).
+
+    Retorna um resultado por texto, na mesma ordem; `input_tokens` é a contagem usada nos que falharem.
+    """
+    start_time = time.time()
+    model_config = MODEL_CONFIGS[model_key]
+    client = _get_client("gemini")
+    requests = []
+    for text in texts:
+        request = _gemini_request(text, prompt, model_config, LaborSentenceExtraction)
+        requests.append(types.InlinedRequest(contents=request["contents"], config=request["config"]))
+    responses = []
+    try:
+        job = client.batches.create(model=model_config.model_id, src=requests)
+        while job.state.name not in _GEMINI_BATCH_TERMINAL_STATES:
+            time.sleep(poll_seconds)
+            job = client.batches.get(name=job.name)
+        if job.dest and job.dest.inlined_responses:
+            responses = job.dest.inlined_responses
+        missing_message = f"Batch {job.name} terminou com status {job.state.name}"
+    except Exception as e:
+        missing_message = str(e)
+
+    results = []
+    for i, n_tokens in enumerate(input_tokens):
+        try:
+            if i >= len(responses):
+                raise RuntimeError(missing_message)
+            if responses[i].error:
+                raise RuntimeError(responses[i].error.message or str(responses[i].error))
+            results.append(_success_result(model_config, _gemini_response(responses[i].response, LaborSentenceExtraction), start_time))
+        except Exception as e:
+            results.append(_failure_result(model_config, n_tokens, start_time, e))
+    return results
+
+# Funções de Batch API por provedor; o Groq não tem e segue pelas requisições diretas
+_BATCH_API_EXTRACTORS = {
+    "openai": extract_with_openai_batch,
+    "gemini": extract_with_gemini_batch,
+}
+
+def _batch_api_chunks(jobs: list, provider: str, prompt: str) -> List[list]:
+    """Divide os pedidos em jobs dentro dos limites (de requisições e de bytes) da Batch API do provedor."""
+    if provider == "openai":
+        # cada linha do JSONL repete o prompt e o esquema, além do texto escapado em JSON
+        max_requests, max_bytes = _OPENAI_BATCH_MAX_REQUESTS, _OPENAI_BATCH_MAX_BYTES
+        overhead_bytes = (
+            len(orjson.dumps(prompt)) + len(orjson.dumps(_openai_batch_text_format()))
+            + _OPENAI_BATCH_LINE_OVERHEAD_BYTES
+        )
+    else:
+        max_requests, max_bytes = None, _GEMINI_BATCH_MAX_BYTES
+        overhead_bytes = _GEMINI_BATCH_REQUEST_OVERHEAD_BYTES
+    chunks, chunk, chunk_bytes = [], [], 0
+    for job in jobs:
+        if provider == "openai":
+            job_bytes = len(orjson.dumps(job[1])) + overhead_bytes
+        else:
+            job_bytes = len(job[1].encode("utf-8")) + overhead_bytes
+        if chunk and (chunk_bytes + job_bytes > max_bytes or len(chunk) == max_requests):
+            chunks.append(chunk)
+            chunk, chunk_bytes = [], 0
+        chunk.append(job)
+        chunk_bytes += job_bytes
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+class _RateLimiter:
+    """Espaça o início das requisições para respeitar um limite de requisições por minuto."""
+
+    def __init__(self, rpm: Optional[int]):
+        self.interval = 60.0 / rpm if rpm else 0.0
+        self._lock = asyncio.Lock()
+        self._next_slot = 0.0
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+def _as_results_table(table: pa.Table) -> pa.Table:
+    """
+    Adapta ao `RESULTS_SCHEMA` um parquet de resultados gravado por versões anteriores
+
+    Colunas ausentes (como `prompt_hash`) entram nulas, e `extracted_data` gravado como
+    struct é serializado em JSON, como as linhas novas.
+    """
+    for field in RESULTS_SCHEMA:
+        if field.name not in table.column_names:
+            table = table.append_column(field.name, pa.nulls(len(table), field.type))
+    extracted = table.column("extracted_data")
+    if not (pa.types.is_string(extracted.type) or pa.types.is_large_string(extracted.type)):
+        serialized = pa.array([
+            None if data is None else orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+            for data in extracted.to_pylist()
+        ], type=pa.string())
+        table = table.set_column(table.column_names.index("extracted_data"), "extracted_data", serialized)
+    return table.select(RESULTS_SCHEMA.names).cast(RESULTS_SCHEMA)
+
+def _provider_limit(models: List[str], provider: str, field: str, default: Optional[int]) -> Optional[int]:
+    """Menor limite entre `default` e o campo `field` dos modelos do provedor que o definem."""
+    limits = [getattr(MODEL_CONFIGS[model_key], field) for model_key in models
+              if MODEL_CONFIGS[model_key].provider == provider]
+    limits = [limit for limit in (default, *limits) if limit]
+    return min(limits) if limits else None
+
+def _run_sync(coro):
+    """Executa uma corrotina a partir de código síncrono, inclusive dentro de um loop já ativo (Jupyter)."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    # A loop is already running (e.g. ipykernel): run ours in a separate thread
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+async def arun_extraction_batch(
     df: pd.DataFrame,
     text_column: str,
     prompt_path: str,
     models: List[str],
     max_tokens: int = 120000,
-    output_path: Optional[str] = None
+    output_path: Optional[str] = None,
+    max_concurrency: int = 16,
+    rate_limit_rpm: Optional[int] = None,
+    flush_every: int = 64,
+    use_batch_api: bool = False,
+    batch_poll_seconds: float = 30.0,
+    pack_size: int = 1,
+    cache_dir: Optional[str] = None
 ) -> pd.DataFrame:
-    """Realiza extração em lote de textos com múltiplos modelos."""
+    """Realiza extração em lote de textos com múltiplos modelos, com requisições concorrentes.
+
+    As chamadas às APIs são limitadas a `max_concurrency` simultâneas por provedor e,
+    opcionalmente, a `rate_limit_rpm` requisições por minuto por provedor; os campos
+    `max_concurrency` e `rpm` dos `ModelConfig` apertam esses limites. Respostas 429
+    são repetidas pelos próprios SDKs, com backoff exponencial e jitter.
+
+    Os textos com `enc_len` >= `max_tokens` são descartados; a coluna pode ser calculada
+    antes com `utils.contar_tokens_batch(df[text_column].tolist())` para um filtro exato;
+    se ausente, o filtro é heurístico pelo número de caracteres e só os textos de tamanho
+    duvidoso são tokenizados aqui.
+
+    Com `output_path`, os resultados são gravados à medida que terminam, em row groups
+    de `flush_every` linhas, num arquivo temporário que substitui `output_path` ao final
+    (inclusive se a execução for interrompida por uma exceção); o DataFrame retornado é
+    lido do arquivo. Se o processo for morto, o `output_path` anterior fica intacto.
+    Se o arquivo já existir, os pares (processo, modelo) extraídos com sucesso usando
+    o mesmo prompt são mantidos e não são requisitados de novo.
+
+    Com `use_batch_api`, os modelos OpenAI e Gemini são enviados de uma vez pela Batch API
+    (metade do custo, sem pressão de RPM, mas o resultado pode levar até 24h);
+    o Groq segue pelas requisições diretas.
+
+    Com `pack_size` > 1, as requisições diretas levam `pack_size` documentos de uma vez
+    (útil quando o limite é de requisições por minuto, como no Groq).
+
+    Com `cache_dir`, as requisições diretas individuais passam por um `ExtractionCache`
+    nesse diretório: textos já extraídos com o mesmo prompt e modelo não chamam a API.
+    """
     
     # Load prompt
     prompt = load_prompt(prompt_path)
+    cache = ExtractionCache(cache_dir) if cache_dir else None
+    # Identifies the prompt version, so editing the prompt invalidates previous results
+    prompt_hash = hashlib.blake2b(prompt.encode(), digest_size=8).hexdigest()
     
-    # Filter by token count
-    df_filtered = df[df["enc_len"] < max_tokens].copy()
+    # Filter by token count, keeping only the columns read below (no full-frame copy)
+    if "enc_len" in df.columns:
+        keep = df["enc_len"].to_numpy() < max_tokens
+    else:
+        keep = _within_token_limit(df[text_column], max_tokens)
+    df_filtered = df.loc[keep, [c for c in ("processo", text_column) if c in df.columns]]
     
-    results = []
+    # One semaphore and rate limiter per provider, so each provider's limits are saturated
+    # independently; each uses the tightest of the argument and its models' own limits
+    providers = {MODEL_CONFIGS[model_key].provider for model_key in models}
+    semaphores = {
+        provider: asyncio.Semaphore(_provider_limit(models, provider, "max_concurrency", max_concurrency))
+        for provider in providers
+    }
+    limiters = {
+        provider: _RateLimiter(_provider_limit(models, provider, "rpm", rate_limit_rpm))
+        for provider in providers
+    }
+    
+    def _row(processo, result: ExtractionResult) -> dict:
+        # Convert to dict for storage
+        return {
+            "processo": processo,
+            "model_name": result.model_name,
+            "provider": result.provider,
+            "prompt_hash": prompt_hash,
+            "input_tokens": result.input_tokens,
+            "output_tokens": result.output_tokens,
+            "extraction_time_seconds": result.extraction_time_seconds,
+            "success": result.success,
+            "error_message": result.error_message,
+            "extracted_data": result.extracted_data.model_dump_json() if result.extracted_data else None,
+        }
     
-    for idx, row in tqdm(df_filtered.iterrows(), total=len(df_filtered), desc="Processing texts"):
-        text = row[text_column]
-        processo = row.get("processo", f"doc_{idx}")
-        
-        for model_key in models:
+    # Each task returns a list of result rows: one for online requests, many for a Batch API job
+    async def _one(processo, text, model_key):
+        model_config = MODEL_CONFIGS[model_key]
+        async with semaphores[model_config.provider]:
+            await limiters[model_config.provider].wait()
             try:
-                result = extract_with_direct_api(text, prompt, model_key)
-                
-                # Convert to dict for storage
-                result_dict = {
-                    "processo": processo,
-                    "model_name": result.model_name,
-                    "provider": result.provider,
-                    "input_tokens": result.input_tokens,
-                    "output_tokens": result.output_tokens,
-                    "extraction_time_seconds": result.extraction_time_seconds,
-                    "success": result.success,
-                    "error_message": result.error_message,
-                    "extracted_data": result.extracted_data.model_dump() if result.extracted_data else None,
-                }
-
-                results.append(result_dict)
+                result = await aextract_with_direct_api(text, prompt, model_key, prompt_tokens, cache)
+                return [_row(processo, result)]
 
             except Exception as e:
                 # Log error and continue
-                error_dict = {
+                return [{
                     "processo": processo,
-                    "model_name": MODEL_CONFIGS[model_key].name,
-                    "provider": MODEL_CONFIGS[model_key].provider,
-                    "input_tokens": 0,
+                    "model_name": model_config.name,
+                    "provider": model_config.provider,
+                    "prompt_hash": prompt_hash,
+                    "input_tokens": _fallback_input_tokens(text, prompt, prompt_tokens),
                     "output_tokens": 0,
                     "extraction_time_seconds": 0,
                     "success": False,
                     "error_message": str(e),
                     "extracted_data": None,
-                }
-                results.append(error_dict)
-    results_df = pd.DataFrame(results)
-    if output_path:
-        results_df.to_parquet(output_path, index=False)
-    return results_df
+                }]
+    
+    # Packed and Batch API requests need per-document counts up front (to split the
+    # reported usage and for failures), encoded in one batched pass off the event loop
+    async def _input_tokens(texts):
+        return [prompt_tokens + n_tokens for n_tokens in await asyncio.to_thread(token_count_batch, texts)]
+    
+    async def _pack(jobs, model_key):
+        model_config = MODEL_CONFIGS[model_key]
+        texts = [text for _, text in jobs]
+        input_tokens = await _input_tokens(texts)
+        async with semaphores[model_config.provider]:
+            await limiters[model_config.provider].wait()
+            results = await aextract_packed_with_direct_api(texts, prompt, model_key, input_tokens)
+        return [_row(processo, result) for (processo, _), result in zip(jobs, results)]
+    
+    async def _batch(jobs, model_key):
+        # jobs: (processo, text); results come back in job order
+        texts = [text for _, text in jobs]
+        results = await asyncio.to_thread(
+            _BATCH_API_EXTRACTORS[MODEL_CONFIGS[model_key].provider], texts, prompt, model_key,
+            await _input_tokens(texts), batch_poll_seconds
+        )
+        return [_row(processo, result) for (processo, _), result in zip(jobs, results)]
+    
+    # Only the two needed columns, as plain lists (no per-row Series); ids are normalised to
+    # str up front, since the results schema stores `processo` as a string
+    if "processo" in df_filtered.columns:
+        processos = [None if pd.isna(processo) else str(processo) for processo in df_filtered["processo"].tolist()]
+    else:
+        processos = [f"doc_{idx}" for idx in df_filtered.index]
+    rows = list(zip(processos, df_filtered[text_column].tolist()))
+    
+    # Resume: successful rows from a previous run with the same prompt are not extracted again
+    existing = None
+    done = set()
+    if output_path and os.path.exists(output_path):
+        existing = _as_results_table(pq.read_table(output_path))
+        done = {
+            (processo, model_name)
+            for processo, model_name, row_hash, success in zip(
+                *(existing.column(name).to_pylist() for name in ("processo", "model_name", "prompt_hash", "success"))
+            )
+            if success and row_hash == prompt_hash
+        }
+    
+    # The prompt is encoded once; texts are only counted locally when a count is needed
+    # (successful direct requests use the usage reported by the API)
+    prompt_tokens = token_count(prompt)
+    
+    tasks = []
+    for model_key in models:
+        model_config = MODEL_CONFIGS[model_key]
+        jobs = [(processo, text) for processo, text in rows if (processo, model_config.name) not in done]
+        if use_batch_api and model_config.provider in _BATCH_API_EXTRACTORS:
+            tasks.extend(_batch(chunk, model_key) for chunk in _batch_api_chunks(jobs, model_config.provider, prompt))
+        elif pack_size > 1:
+            tasks.extend(_pack(jobs[start:start + pack_size], model_key) for start in range(0, len(jobs), pack_size))
+        else:
+            tasks.extend(_one(processo, text, model_key) for processo, text in jobs)
+    # The SDK clients opened inside this event loop are closed with it (see the finally below)
+    try:
+        completed = tqdm_asyncio.as_completed(tasks, total=len(tasks), desc="Processing texts")
+        if not output_path:
+            # Same fixed schema as the parquet output, so both paths return identical dtypes
+            results = [row for result in completed for row in await result]
+            # Tasks finish in any order; restore the input's row-major (processo, then model) order
+            order = {}
+            for processo, _ in rows:
+                for model_key in models:
+                    order.setdefault((processo, MODEL_CONFIGS[model_key].name), len(order))
+            results.sort(key=lambda row: order[(row["processo"], row["model_name"])])
+            return pa.Table.from_pylist(results, schema=RESULTS_SCHEMA).to_pandas()
+    
+        # Stream finished results to a temporary file so memory stays bounded; it replaces
+        # `output_path` only once closed, so a killed run leaves the previous file intact
+        partial_path = f"{output_path}.partial"
+        writer = pq.ParquetWriter(
+            partial_path, RESULTS_SCHEMA, compression="zstd", use_dictionary=_RESULTS_DICTIONARY_COLUMNS
+        )
+        buffer = []
+        try:
+            if existing is not None:
+                # Carry over previous rows, except stale or failed ones that are being re-extracted now
+                pending = {
+                    (processo, MODEL_CONFIGS[model_key].name)
+                    for processo, _ in rows
+                    for model_key in models
+                } - done
+                keep = [
+                    pair not in pending
+                    for pair in zip(existing.column("processo").to_pylist(), existing.column("model_name").to_pylist())
+                ]
+                writer.write_table(existing.filter(pa.array(keep, type=pa.bool_())))
+            for result in completed:
+                buffer.extend(await result)
+                if len(buffer) >= flush_every:
+                    writer.write_table(pa.Table.from_pylist(buffer, schema=RESULTS_SCHEMA))
+                    buffer.clear()
+            if buffer:
+                writer.write_table(pa.Table.from_pylist(buffer, schema=RESULTS_SCHEMA))
+        finally:
+            # Also on exceptions, so rows finished before the error are kept
+            writer.close()
+            os.replace(partial_path, output_path)
+        return pq.read_table(output_path).to_pandas()
+    finally:
+        await _aclose_async_clients()
+
+def run_extraction_batch(
+    df: pd.DataFrame,
+    text_column: str,
+    prompt_path: str,
+    models: List[str],
+    max_tokens: int = 120000,
+    output_path: Optional[str] = None,
+    max_concurrency: int = 16,
+    rate_limit_rpm: Optional[int] = None,
+    flush_every: int = 64,
+    use_batch_api: bool = False,
+    batch_poll_seconds: float = 30.0,
+    pack_size: int = 1,
+    cache_dir: Optional[str] = None
+) -> pd.DataFrame:
+    """Realiza extração em lote de textos com múltiplos modelos (versão síncrona de `arun_extraction_batch`)."""
+    return _run_sync(arun_extraction_batch(
+        df, text_column, prompt_path, models,
+        max_tokens=max_tokens,
+        output_path=output_path,
+        max_concurrency=max_concurrency,
+        rate_limit_rpm=rate_limit_rpm,
+        flush_every=flush_every,
+        use_batch_api=use_batch_api,
+        batch_poll_seconds=batch_poll_seconds,
+        pack_size=pack_size,
+        cache_dir=cache_dir
+    ))
+
+def run_extraction_batch_api(
+    df: pd.DataFrame,
+    text_column: str,
+    prompt_path: str,
+    models: List[str],
+    max_tokens: int = 120000,
+    output_path: Optional[str] = None,
+    batch_poll_seconds: float = 30.0,
+    max_concurrency: int = 16,
+    rate_limit_rpm: Optional[int] = None,
+    flush_every: int = 64
+) -> pd.DataFrame:
+    """Extração em lote para execuções offline: OpenAI e Gemini pela Batch API, Groq por requisições diretas."""
+    return run_extraction_batch(
+        df, text_column, prompt_path, models,
+        max_tokens=max_tokens,
+        output_path=output_path,
+        max_concurrency=max_concurrency,
+        rate_limit_rpm=rate_limit_rpm,
+        flush_every=flush_every,
+        use_batch_api=True,
+        batch_poll_seconds=batch_poll_seconds
+    )
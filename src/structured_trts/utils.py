@@ -2,12 +2,17 @@
 Utils para leitura de arquivos
 """
 from pathlib import Path
-import json
+from functools import lru_cache
+import os
+import orjson
 import tiktoken
 import pandas as pd
 import numpy as np
 
-enc = tiktoken.encoding_for_model("gpt-4.1-mini")
+@lru_cache(maxsize=None)
+def _get_enc(model_name: str = "gpt-4.1-mini") -> tiktoken.Encoding:
+    """Tokenizador de cada modelo, carregado uma única vez (sob demanda, não no import)."""
+    return tiktoken.encoding_for_model(model_name)
 
 def ler_arquivo(path: str) -> str:
     """
@@ -38,8 +43,8 @@ def ler_arquivo_json(path: str) -> dict:
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
         s = f.read()
     try:
-        return json.loads(s)
-    except json.JSONDecodeError:
+        return orjson.loads(s)
+    except orjson.JSONDecodeError:
         return {}
 
 def clean_metadata(metadata_list):
@@ -54,55 +59,64 @@ def clean_metadata(metadata_list):
     for metadata in metadata_list:
         if not isinstance(metadata, dict):
             continue
-        # Verifica se tramitação atual é G1
-        tramitacao_atual = metadata.get('tramitacaoAtual', {})
-        grau_atual = tramitacao_atual.get('grau', {})
         # se tramitação atual é G1, mantém apenas ela
-        if grau_atual.get('sigla') == 'G1':
+        tramitacao_atual = metadata.get('tramitacaoAtual') or {}
+        if (tramitacao_atual.get('grau') or {}).get('sigla') == 'G1':
             resultado.append(tramitacao_atual)
-        # se tramitação atual não é G1, busca a tramitação G1 e mantém apenas ela
-        else:
-            tramitacoes = metadata.get('tramitacoes', [{}])
-            for tram in tramitacoes:
-                if tram.get('grau', {}).get('sigla') == 'G1':
-                    resultado.append(tram)
+            continue
+        # se tramitação atual não é G1, busca a (primeira) tramitação G1 e mantém apenas ela
+        for tram in metadata.get('tramitacoes') or ():
+            if (tram.get('grau') or {}).get('sigla') == 'G1':
+                resultado.append(tram)
+                break
     return resultado
 
 def juntar_com_separador(group):
     """Junta textos com separador incluindo nome do arquivo"""
-    textos_com_separador = []
-    textos_sentencas_com_separador = []
-    for _, row in group.iterrows():
-        nome_arquivo = Path(row['value']).name
-        separador = f"\n\n# Arquivo {nome_arquivo} ---------------------------\n\n"
-        # Adiciona separador + texto para todos os arquivos
-        textos_com_separador.append(separador + row['txt'])
-        # Para sentenças/audiências, só adiciona se o arquivo contém esses termos
-        termos = ['sentença', 'sentenca', 'audiência', 'audiencia']
-        if pd.notna(row['value']) and any(termo in row['value'].lower() for termo in termos):
-            textos_sentencas_com_separador.append(separador + row['txt'])
+    nomes_arquivos = group['value'].map(lambda p: Path(p).name)
+    # Adiciona separador + texto para todos os arquivos
+    textos_com_separador = "\n\n# Arquivo " + nomes_arquivos + " ---------------------------\n\n" + group['txt']
+    # Para sentenças/audiências, só adiciona se o arquivo contém esses termos
+    eh_sentenca = group['value'].str.lower().str.contains('senten[cç]a|audi[eê]ncia', regex=True, na=False)
     return pd.Series({
         'txt': '\n'.join(textos_com_separador),
-        'txt_sentencas': '\n'.join(textos_sentencas_com_separador)
+        'txt_sentencas': '\n'.join(textos_com_separador[eh_sentenca])
     })
 
 def numpy_to_python(obj):
     """Converte objetos numpy para Python"""
     if isinstance(obj, np.ndarray):
+        # arrays numéricos: tolist() já converte tudo em C; arrays de objetos
+        # (ex.: list<struct> lido do parquet) podem ter dicts/arrays aninhados
+        if obj.dtype != object:
+            return obj.tolist()
         return [numpy_to_python(x) for x in obj.tolist()]
+    elif isinstance(obj, np.generic):
+        return obj.item()
     elif isinstance(obj, dict):
         return {k: numpy_to_python(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
+    elif isinstance(obj, (list, tuple)):
         return [numpy_to_python(x) for x in obj]
     else:
         return obj
 
-def adicionar_metadados_ao_texto(row):
-    """Adiciona metadados em formato JSON ao início dos textos"""
+def adicionar_metadados_ao_texto(row, debug_pretty: bool = False):
+    """
+    Adiciona metadados em formato JSON ao início dos textos
+    
+    Args:
+        row (pd.Series): linha com 'metadata', 'txt' e 'txt_sentencas'
+        debug_pretty (bool): JSON indentado, para inspeção; o padrão é compacto,
+            que o LLM lê igual e custa menos tokens
+    
+    Returns:
+        pd.Series: textos com os metadados no início
+    """
     # Converter metadados para formato serializável
     metadata_serializavel = numpy_to_python(row['metadata'])
-    # Converter metadados para JSON pretty
-    metadados_json = json.dumps(metadata_serializavel, indent=2, ensure_ascii=False)    
+    # Converter metadados para JSON
+    opcoes = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if debug_pretty else 0)
+    metadados_json = orjson.dumps(metadata_serializavel, option=opcoes).decode()
     # Estrutura com tags
     prefixo = f"<metadados>\n{metadados_json}\n</metadados>\n\n<textos>\n"
     sufixo = "\n</textos>"
@@ -116,14 +130,31 @@ def adicionar_metadados_ao_texto(row):
         'txt_sentencas_com_metadados': txt_sentencas_completo
     })
 
-def contar_tokens(texto: str) -> int:
+def contar_tokens(texto: str, model_name: str = "gpt-4.1-mini") -> int:
     """
     Contagem de tokens
     
     Args:
         texto (str): texto a ser contado
+        model_name (str): modelo cujo tokenizador é usado
     
     Returns:
         int: número de tokens
     """
-    return len(enc.encode(texto))
+    return len(_get_enc(model_name).encode(texto))
+
+def contar_tokens_batch(textos: list[str], n_threads: int | None = None, model_name: str = "gpt-4.1-mini") -> np.ndarray:
+    """
+    Contagem de tokens em lote, paralelizada nas threads do tokenizador (que liberam o GIL)
+    
+    Args:
+        textos (list[str]): textos a serem contados
+        n_threads (int | None): threads do tokenizador; por padrão, uma por CPU
+        model_name (str): modelo cujo tokenizador é usado
+    
+    Returns:
+        np.ndarray: número de tokens de cada texto
+    """
+    textos = list(textos)
+    tokens = _get_enc(model_name).encode_batch(textos, num_threads=n_threads or os.cpu_count() or 1)
+    return np.fromiter((len(t) for t in tokens), dtype=np.int32, count=len(textos))